@@ -874,7 +874,7 @@ class Misc(commands.Cog):
 
             for bot in self.bot.pool.get_all_bots():
 
-                db_data = await bot.pool.database.query_data(collection=str(bot.user.id), db_name=DBModel.guilds, limit=300)
+                db_data = await bot.pool.database.query_data(collection=str(bot.user.id), db_name=DBModel.guilds, limit=None)
     
                 async with aiofiles.open(f"./local_database/fixfavs_backup/guild_favs_{bot.user.id}.json", "w") as f:
                     await f.write(json.dumps(db_data, indent=4))
@@ -886,7 +886,7 @@ class Misc(commands.Cog):
                         continue
                     await bot.update_data(id_=data["_id"], data=data, db_name=DBModel.guilds)
 
-            db_data = await self.bot.pool.database.query_data(collection="global", db_name=DBModel.users, limit=500)
+            db_data = await self.bot.pool.database.query_data(collection="global", db_name=DBModel.users, limit=None)
 
             async with aiofiles.open("./local_database/fixfavs_backup/user_favs.json", "w") as f:
                 await f.write(json.dumps(db_data, indent=4))
@@ -638,7 +638,7 @@ class PlayerSession(commands.Cog):
 
         guild_data = []
 
-        for d in (await self.bot.pool.mongo_database.query_data(db_name=str(self.bot.user.id), collection="player_sessions")):
+        for d in (await self.bot.pool.mongo_database.query_data(db_name=str(self.bot.user.id), collection="player_sessions", limit=None)):
 
             try:
                 data = d["data"]
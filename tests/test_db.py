@@ -0,0 +1,96 @@
+import asyncio
+from collections import OrderedDict
+from copy import deepcopy
+
+import pytest
+
+pytest.importorskip("disnake")
+pytest.importorskip("motor")
+pytest.importorskip("aiofiles")
+
+from utils import db
+
+
+def _set_path(doc: dict, path: str, value):
+    parts = path.split(".")
+    for part in parts[:-1]:
+        doc = doc.setdefault(part, {})
+    doc[parts[-1]] = value
+
+
+class FakeCollection:
+
+    def __init__(self):
+        self.docs = {}
+        self.gate = None
+        self.started = asyncio.Event()
+
+    async def find_one(self, query, projection=None):
+        doc = deepcopy(self.docs.get(query["_id"]))
+        self.started.set()
+        if self.gate:
+            gate, self.gate = self.gate, None
+            await gate.wait()
+        return doc
+
+    async def update_one(self, query, update, upsert=False):
+        doc = self.docs.setdefault(query["_id"], {"_id": query["_id"]})
+        for k, v in update["$set"].items():
+            _set_path(doc, k, deepcopy(v))
+
+
+class FakeClient:
+
+    def __init__(self):
+        self.collections = {}
+
+    def __getitem__(self, collection):
+        client = self
+
+        class Database:
+            def __getitem__(self, db_name):
+                return client.collections.setdefault((collection, db_name), FakeCollection())
+
+        return Database()
+
+
+def make_mongo(tmp_path):
+    database = db.MongoDatabase.__new__(db.MongoDatabase)
+    db.BaseDB.__init__(database)
+    database._connect = FakeClient()
+    database._last_sent = OrderedDict()
+    database.cache = db.LocalDatabase(dir_=str(tmp_path / "db_cache"))
+    return database
+
+
+def test_read_racing_write_does_not_cache_or_snapshot_stale_data(tmp_path):
+
+    async def scenario():
+        database = make_mongo(tmp_path)
+        coll = database._connect["123"][db.DBModel.guilds]
+
+        doc = database.get_default("123", db.DBModel.guilds)
+        doc["_id"] = "1"
+        coll.docs["1"] = doc
+
+        gate = asyncio.Event()
+        coll.gate = gate
+
+        read = asyncio.create_task(database.get_data(1, db_name=db.DBModel.guilds, collection="123"))
+        await coll.started.wait()
+
+        data = database.get_default("123", db.DBModel.guilds)
+        data["autoplay"] = True
+        await database.update_data(1, data, db_name=db.DBModel.guilds, collection="123")
+
+        gate.set()
+        assert (await read)["autoplay"] is False
+
+        data = await database.get_data(1, db_name=db.DBModel.guilds, collection="123")
+        assert data["autoplay"] is True
+
+        data["autoplay"] = False
+        await database.update_data(1, data, db_name=db.DBModel.guilds, collection="123")
+        assert coll.docs["1"]["autoplay"] is False
+
+    asyncio.run(scenario())
@@ -413,7 +413,7 @@ class BotPool:
             self.mongo_database = MongoDatabase(mongo_key, timeout=self.config["MONGO_TIMEOUT"])
             print("Database em uso: MongoDB")
         else:
-            print("Database em uso: TinyMongo | Nota: Os arquivos da database serão salvos localmente na pasta: local_database")
+            print("Database em uso: SQLite | Nota: Os arquivos da database serão salvos localmente na pasta: local_database")
 
         self.local_database = LocalDatabase()
 
@@ -666,6 +666,9 @@ class BotPool:
 
                         bot.sync_command_cooldowns()
 
+                        if self.mongo_database and bot.intents.message_content:
+                            await self.mongo_database.warm_prefixes([g.id for g in bot.guilds])
+
                     except Exception:
                         traceback.print_exc()
 
@@ -726,6 +729,9 @@ class BotPool:
 
         loop.create_task(self.load_playlist_cache())
 
+        if self.mongo_database:
+            loop.create_task(self.mongo_database.warmup())
+
         for lserver in LAVALINK_SERVERS.values():
             self.lavalink_connect_queue[lserver["identifier"]] = asyncio.Queue()
             loop.create_task(self.connect_lavalink_queue_task(lserver["identifier"]))
@@ -775,6 +781,7 @@ class BotCore(commands.AutoShardedBot):
         self.exclusive_guild_id: Optional[int] = None
         self.bot_ready = False
         self.initializing = False
+        self.mention_prefixes: tuple = ()
         self.player_skins = {}
         self.player_static_skins = {}
         self.default_skin = self.config.get("DEFAULT_SKIN", "default")
@@ -875,10 +882,10 @@ class BotCore(commands.AutoShardedBot):
             id_=id_, data=data, db_name=db_name, collection=str(self.user.id)
         )
 
-    async def get_global_data(self, id_: int, *, db_name: Union[DBModel.guilds, DBModel.users]):
+    async def get_global_data(self, id_: int, *, db_name: Union[DBModel.guilds, DBModel.users], projection: dict = None):
 
         data = await self.pool.database.get_data(
-            id_=id_, db_name=db_name, collection="global", default_model=global_db_models
+            id_=id_, db_name=db_name, collection="global", default_model=global_db_models, projection=projection
         )
 
         if db_name == DBModel.users:
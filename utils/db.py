@@ -1,34 +1,51 @@
 # -*- coding: utf-8 -*-
 from __future__ import annotations
 
-import collections.abc
+import asyncio
+import functools
 import json
 import os
+import re
 import shutil
+import sqlite3
+import time
 import traceback
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from copy import deepcopy
 from datetime import datetime
-from typing import TYPE_CHECKING, Union
+from types import MappingProxyType
+from typing import TYPE_CHECKING, Final, Union
 from urllib.parse import urlparse, parse_qs, urlunparse, urlencode
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    from ciso8601 import parse_datetime
+except ImportError:
+    parse_datetime = None
+
+import aiofiles
 import disnake
 from disnake.ext import commands
 from motor.motor_asyncio import AsyncIOMotorClient
-from tinydb_serialization import Serializer, SerializationMiddleware
-from tinymongo import TinyMongoClient
-from tinymongo.serializers import DateTimeSerializer
+from pymongo import UpdateOne, WriteConcern
 
 if TYPE_CHECKING:
     from utils.client import BotCore
 
 class DBModel:
-    guilds = "guilds"
-    users = "users"
-    default = "default"
+    __slots__ = ()
+    guilds: Final[str] = "guilds"
+    users: Final[str] = "users"
+    default: Final[str] = "default"
 
 
-db_models = {
-    DBModel.guilds: {
+db_models = MappingProxyType({
+    DBModel.guilds: MappingProxyType({
         "ver": 1.10,
         "player_controller": {
             "channel": None,
@@ -44,23 +61,23 @@ db_models = {
         "default_player_volume": 100,
         "enable_prefixed_commands": True,
         "djroles": []
-    },
-    DBModel.users: {
+    }),
+    DBModel.users: MappingProxyType({
         "ver": 1.0,
         "fav_links": {},
-    }
-}
+    })
+})
 
-global_db_models = {
-    DBModel.users: {
+global_db_models = MappingProxyType({
+    DBModel.users: MappingProxyType({
         "ver": 1.4,
         "fav_links": {},
         "integration_links": {},
         "token": "",
         "custom_prefix": "",
         "last_tracks": [],
-    },
-    DBModel.guilds: {
+    }),
+    DBModel.guilds: MappingProxyType({
         "ver": 1.4,
         "prefix": "",
         "global_skin": False,
@@ -70,17 +87,20 @@ global_db_models = {
         "custom_skins": {},
         "custom_skins_static": {},
         "listen_along_invites": {},
-    },
-    DBModel.default: {
+    }),
+    DBModel.default: MappingProxyType({
         "ver": 1.0,
         "extra_tokens": {}
-    }
-}
+    })
+})
 
 
 async def get_prefix(bot: BotCore, message: disnake.Message):
 
-    if str(message.content).startswith((f"<@!{bot.user.id}> ", f"<@{bot.user.id}> ")):
+    if not bot.mention_prefixes:
+        bot.mention_prefixes = (f"<@!{bot.user.id}> ", f"<@{bot.user.id}> ")
+
+    if message.content.startswith(bot.mention_prefixes):
         return commands.when_mentioned(bot, message)
 
     try:
@@ -99,7 +119,7 @@ async def get_prefix(bot: BotCore, message: disnake.Message):
     try:
         guild_prefix = bot.pool.guild_prefix_cache[message.guild.id]
     except KeyError:
-        data = await bot.get_global_data(message.guild.id, db_name=DBModel.guilds)
+        data = await bot.get_global_data(message.guild.id, db_name=DBModel.guilds, projection=PREFIX_PROJECTION)
         guild_prefix = data.get("prefix")
 
     if not guild_prefix:
@@ -108,35 +128,252 @@ async def get_prefix(bot: BotCore, message: disnake.Message):
     return guild_prefix
 
 
+_RETRY_FETCH = object()
+
+PREFIX_PROJECTION = MappingProxyType({"prefix": 1, "_id": 0})
+
+
+def _projection_key(projection) -> tuple:
+    return tuple(sorted((k, bool(v)) for k, v in projection.items()))
+
+
 class BaseDB:
 
+    def __init__(self):
+        self._cache: OrderedDict[tuple, tuple[float, dict]] = OrderedDict()
+        self._cache_ttl = 60
+        self._cache_max_size = 10000
+        self._cache_variants: dict[tuple, set[tuple]] = {}
+        self._cache_generations: OrderedDict[tuple, int] = OrderedDict()
+        self._cache_generation_floor = 0
+        self._write_seq = 0
+        self._inflight: dict[tuple, asyncio.Future] = {}
+
+    def _cache_generation(self) -> int:
+        return self._write_seq
+
+    def _cache_stale(self, key: tuple, generation: int) -> bool:
+        return self._cache_generations.get(key[:3], self._cache_generation_floor) > generation
+
+    def _cache_get(self, key: tuple):
+
+        try:
+            ts, data = self._cache[key]
+        except KeyError:
+            return None
+
+        if time.monotonic() - ts >= self._cache_ttl:
+            del self._cache[key]
+            self._forget_variant(key)
+            return None
+
+        self._cache.move_to_end(key)
+        return deepcopy(data)
+
+    def _forget_variant(self, key: tuple):
+        if len(key) > 3 and (variants := self._cache_variants.get(key[:3])) is not None:
+            variants.discard(key)
+            if not variants:
+                del self._cache_variants[key[:3]]
+
+    def _cache_set(self, key: tuple, data: dict, generation: int = None):
+        if generation is not None and self._cache_stale(key, generation):
+            return
+        self._cache[key] = (time.monotonic(), deepcopy(data))
+        self._cache.move_to_end(key)
+        if len(key) > 3:
+            self._cache_variants.setdefault(key[:3], set()).add(key)
+        while len(self._cache) > self._cache_max_size:
+            evicted, _ = self._cache.popitem(last=False)
+            self._forget_variant(evicted)
+
+    def _cache_pop(self, key: tuple):
+        self._write_seq += 1
+        self._cache_generations[key] = self._write_seq
+        self._cache_generations.move_to_end(key)
+        while len(self._cache_generations) > self._cache_max_size:
+            _, generation = self._cache_generations.popitem(last=False)
+            self._cache_generation_floor = max(self._cache_generation_floor, generation)
+        self._cache.pop(key, None)
+        for variant in self._cache_variants.pop(key, ()):
+            self._cache.pop(variant, None)
+        for inflight_key in [k for k in self._inflight if k[:3] == key]:
+            del self._inflight[inflight_key]
+
+    async def _singleflight(self, key: tuple, fetch):
+
+        while (fut := self._inflight.get(key)) is not None:
+            if (data := await asyncio.shield(fut)) is not _RETRY_FETCH:
+                return deepcopy(data)
+
+        fut = asyncio.get_running_loop().create_future()
+        self._inflight[key] = fut
+
+        try:
+            data = await fetch()
+        except asyncio.CancelledError:
+            fut.set_result(_RETRY_FETCH)
+            raise
+        except Exception as e:
+            fut.set_exception(e)
+            fut.exception()
+            raise
+        else:
+            fut.set_result(deepcopy(data))
+        finally:
+            if self._inflight.get(key) is fut:
+                del self._inflight[key]
+
+        return data
+
     def get_default(self, collection: str, db_name: Union[DBModel.guilds, DBModel.users]):
         if collection == "global":
-            return deepcopy(global_db_models[db_name])
-        return deepcopy(db_models[db_name])
+            return _fresh_template(global_db_models, db_name)
+        return _fresh_template(db_models, db_name)
+
 
 
+_ISO_DATETIME = re.compile(r'^(\d{4})-(\d{2})-(\d{2})T(\d{2}):(\d{2}):(\d{2})$')
+_DEFAULT_DATETIME_FORMAT = '%Y-%m-%dT%H:%M:%S'
 
-class DatetimeSerializer(Serializer):
+
+class DatetimeSerializer:
     OBJ_CLASS = datetime
 
-    def __init__(self, format='%Y-%m-%dT%H:%M:%S', *args, **kwargs):
-        super(DatetimeSerializer, self).__init__(*args, **kwargs)
+    def __init__(self, format=_DEFAULT_DATETIME_FORMAT):
         self._format = format
 
     def encode(self, obj):
+        if self._format == _DEFAULT_DATETIME_FORMAT:
+            if obj.tzinfo is None:
+                return obj.isoformat(timespec='seconds')
+            return f"{obj.year:04d}-{obj.month:02d}-{obj.day:02d}T{obj.hour:02d}:{obj.minute:02d}:{obj.second:02d}"
         return obj.strftime(self._format)
 
     def decode(self, s):
+        if self._format == _DEFAULT_DATETIME_FORMAT:
+            if parse_datetime:
+                return parse_datetime(s)
+            if m := _ISO_DATETIME.match(s):
+                return datetime(*map(int, m.groups()))
         return datetime.strptime(s, self._format)
 
-class CustomTinyMongoClient(TinyMongoClient):
 
-    @property
-    def _storage(self):
-        serialization = SerializationMiddleware()
-        serialization.register_serializer(DateTimeSerializer(), 'TinyDate')
-        return serialization
+_datetime_serializer = DatetimeSerializer()
+
+
+def _json_default(obj):
+    if isinstance(obj, datetime):
+        return {"$date": _datetime_serializer.encode(obj)}
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def _json_object_hook(obj: dict):
+    if len(obj) == 1 and "$date" in obj:
+        return _datetime_serializer.decode(obj["$date"])
+    return obj
+
+
+def _restore_dates(obj):
+    if isinstance(obj, dict):
+        if len(obj) == 1 and "$date" in obj:
+            return _datetime_serializer.decode(obj["$date"])
+        for k, v in obj.items():
+            obj[k] = _restore_dates(v)
+    elif isinstance(obj, list):
+        for i, v in enumerate(obj):
+            obj[i] = _restore_dates(v)
+    return obj
+
+
+def _json_dumps(obj) -> str:
+    if orjson:
+        return orjson.dumps(obj, default=_json_default, option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS).decode()
+    return json.dumps(obj, default=_json_default)
+
+
+def _json_loads(s: str):
+    if orjson:
+        data = orjson.loads(s)
+        if '"$date"' in s:
+            data = _restore_dates(data)
+        return data
+    return json.loads(s, object_hook=_json_object_hook)
+
+
+_MISSING = object()
+
+_template_cache = {
+    id(db_models): {k: _json_dumps(dict(v)) for k, v in db_models.items()},
+    id(global_db_models): {k: _json_dumps(dict(v)) for k, v in global_db_models.items()},
+}
+
+
+def _fresh_template(default_model: dict, db_name: str) -> dict:
+    if default_model is db_models or default_model is global_db_models:
+        return _json_loads(_template_cache[id(default_model)][db_name])
+    return deepcopy(default_model[db_name])
+
+
+class OldLocalDatabase:
+
+    def __init__(self, dir_="./local_database"):
+
+        from tinydb_serialization import SerializationMiddleware
+        from tinymongo import TinyMongoClient
+        from tinymongo.serializers import DateTimeSerializer
+
+        class CustomTinyMongoClient(TinyMongoClient):
+
+            @property
+            def _storage(self):
+                serialization = SerializationMiddleware()
+                serialization.register_serializer(DateTimeSerializer(), 'TinyDate')
+                return serialization
+
+        self.dir = dir_
+        self._connect = CustomTinyMongoClient(dir_)
+
+    @staticmethod
+    def legacy_files(dir_: str) -> list:
+        try:
+            with os.scandir(dir_) as it:
+                return [e.path for e in it if e.name.endswith(".json") and e.is_file()]
+        except FileNotFoundError:
+            return []
+
+    def migrate(self, write):
+
+        for path in self.legacy_files(self.dir):
+
+            collection = os.path.basename(path)[:-5]
+            database = None
+
+            try:
+                with open(path, 'rb') as file:
+                    raw = file.read()
+
+                database = self._connect[collection]
+
+                for db_name in list(orjson.loads(raw) if orjson else json.loads(raw)):
+                    for doc in database[db_name].find({}):
+                        write(collection, db_name, str(doc["_id"]), doc)
+            except Exception:
+                print(f"Falha ao migrar o arquivo: {path}")
+                traceback.print_exc()
+                continue
+            finally:
+                if tinydb := getattr(database, "tinydb", None):
+                    tinydb.close()
+
+            self.mark_migrated(path)
+
+    @staticmethod
+    def mark_migrated(path: str):
+        try:
+            os.rename(path, f"{path}.migrated")
+        except:
+            traceback.print_exc()
 
 
 class LocalDatabase(BaseDB):
@@ -147,30 +384,169 @@ class LocalDatabase(BaseDB):
         if not os.path.isdir(dir_):
             os.makedirs(dir_)
 
-        self._connect = CustomTinyMongoClient(dir_)
+        db_path = os.path.join(dir_, "db.sqlite")
+
+        self._executor = ThreadPoolExecutor(max_workers=1)
+
+        self._conn = sqlite3.connect(db_path, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS kv ("
+            "collection TEXT NOT NULL, db_name TEXT NOT NULL, id TEXT NOT NULL, doc TEXT NOT NULL, "
+            "PRIMARY KEY (collection, db_name, id))"
+        )
+
+        if OldLocalDatabase.legacy_files(dir_):
+            OldLocalDatabase(dir_).migrate(self._find_or_insert)
+
+    async def _run(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    def _find_one(self, collection: str, db_name: str, id_: str):
+        row = self._conn.execute(
+            "SELECT doc FROM kv WHERE collection = ? AND db_name = ? AND id = ?", (collection, db_name, id_)
+        ).fetchone()
+        return _json_loads(row[0]) if row else None
+
+    def _find(self, collection: str, db_name: str, filter: dict = None, limit: int = None, projection: dict = None):
+
+        if filter and any(
+            "." in k or k.startswith("$") or (isinstance(v, dict) and any(str(sk).startswith("$") for sk in v))
+            for k, v in filter.items()
+        ):
+            raise ValueError("O filtro só suporta igualdade em campos de primeiro nível.")
+
+        if filter:
+            rows = self._conn.execute("SELECT doc FROM kv WHERE collection = ? AND db_name = ?", (collection, db_name))
+        else:
+            rows = self._conn.execute(
+                "SELECT doc FROM kv WHERE collection = ? AND db_name = ? LIMIT ?", (collection, db_name, limit or -1)
+            )
+
+        docs = []
+
+        for (doc,) in rows:
+
+            doc = _json_loads(doc)
+
+            if filter and any(doc.get(k) != v for k, v in filter.items()):
+                continue
+
+            docs.append(_apply_projection(doc, projection) if projection else doc)
+
+            if limit and len(docs) >= limit:
+                break
+
+        return docs
+
+    def _upsert(self, collection: str, db_name: str, id_: str, data: dict):
+
+        self._conn.execute("BEGIN IMMEDIATE")
+
+        try:
+            row = self._conn.execute(
+                "SELECT doc FROM kv WHERE collection = ? AND db_name = ? AND id = ?", (collection, db_name, id_)
+            ).fetchone()
+
+            if row:
+                doc = _json_loads(row[0])
+                doc.update(data)
+            else:
+                doc = data
+
+            self._conn.execute(
+                "INSERT OR REPLACE INTO kv (collection, db_name, id, doc) VALUES (?, ?, ?, ?)",
+                (collection, db_name, id_, _json_dumps(doc))
+            )
+        except:
+            self._conn.execute("ROLLBACK")
+            raise
+
+        self._conn.execute("COMMIT")
+
+    def _find_or_insert(self, collection: str, db_name: str, id_: str, default: dict):
+
+        self._conn.execute("BEGIN IMMEDIATE")
+
+        try:
+            row = self._conn.execute(
+                "SELECT doc FROM kv WHERE collection = ? AND db_name = ? AND id = ?", (collection, db_name, id_)
+            ).fetchone()
+
+            if not row:
+                self._conn.execute(
+                    "INSERT INTO kv (collection, db_name, id, doc) VALUES (?, ?, ?, ?)",
+                    (collection, db_name, id_, _json_dumps(default))
+                )
+        except:
+            self._conn.execute("ROLLBACK")
+            raise
+
+        self._conn.execute("COMMIT")
+
+        if row:
+            return _json_loads(row[0]), False
+
+        return default, True
+
+    def _delete(self, collection: str, db_name: str, id_: str):
+        self._conn.execute("DELETE FROM kv WHERE collection = ? AND db_name = ? AND id = ?", (collection, db_name, id_))
+
+    def _delete_many(self, collection: str, db_name: str, ids: list):
+
+        self._conn.execute("BEGIN IMMEDIATE")
+
+        try:
+            self._conn.executemany(
+                "DELETE FROM kv WHERE collection = ? AND db_name = ? AND id = ?",
+                [(collection, db_name, id_) for id_ in ids]
+            )
+        except:
+            self._conn.execute("ROLLBACK")
+            raise
+
+        self._conn.execute("COMMIT")
+
+    async def delete_many(self, ids: list, db_name: str, collection: str):
+        ids = [str(i) for i in ids]
+        for id_ in ids:
+            self._cache_pop((collection, db_name, id_))
+        await self._run(self._delete_many, collection, db_name, ids)
+
+    async def find_one(self, collection: str, db_name: str, id_: str):
+        return await self._run(self._find_one, collection, db_name, str(id_))
 
     async def get_data(self, id_: int, *, db_name: Union[DBModel.guilds, DBModel.users],
-                       collection: str, default_model: dict = None):
+                       collection: str, default_model: dict = None, projection: dict = None):
 
         if not default_model:
             default_model = db_models
 
         id_ = str(id_)
 
-        data = self._connect[collection][db_name].find_one({"_id": id_})
+        cache_key = (collection, db_name, id_)
 
-        if not data:
-            data = default_model[db_name].copy()
-            data["_id"] = str(id_)
-            self._connect[collection][db_name].insert_one(data)
+        if (data := self._cache_get(cache_key)) is not None:
+            return _apply_projection(data, projection) if projection else data
 
-        elif data["ver"] != default_model[db_name]["ver"]:
-            data = update_values(default_model[db_name].copy(), data)
+        default = _fresh_template(default_model, db_name)
+        default["_id"] = id_
+
+        generation = self._cache_generation()
+
+        data, created = await self._run(self._find_or_insert, collection, db_name, id_, default)
+
+        if not created and data["ver"] != default_model[db_name]["ver"]:
+            data = update_values(_fresh_template(default_model, db_name), data)
             data["ver"] = default_model[db_name]["ver"]
 
             await self.update_data(id_, data, db_name=db_name, collection=collection)
+            generation = self._cache_generation()
 
-        return data
+        self._cache_set(cache_key, data, generation)
+
+        return _apply_projection(data, projection) if projection else data
 
     async def update_data(self, id_, data: dict, *, db_name: Union[DBModel.guilds, DBModel.users],
                           collection: str, default_model: dict = None):
@@ -178,22 +554,43 @@ class LocalDatabase(BaseDB):
         id_ = str(id_)
         data["_id"] = id_
 
+        self._cache_pop((collection, db_name, id_))
+
         try:
-            if not self._connect[collection][db_name].update_one({'_id': id_}, {'$set': data}).raw_result:
-                self._connect[collection][db_name].insert_one(data)
+            await self._run(self._upsert, collection, db_name, id_, data)
         except:
             traceback.print_exc()
 
         return data
 
-    async def query_data(self, db_name: str, collection: str, filter: dict = None, limit=500) -> list:
-        return self._connect[collection][db_name].find(filter or {})
+    async def query_data(self, db_name: str, collection: str, filter: dict = None, limit=500,
+                         projection: dict = None) -> list:
+        return await self._run(self._find, collection, db_name, filter, limit, projection)
 
     async def delete_data(self, id_, db_name: str, collection: str):
-        try:
-            return self._connect[collection][db_name].delete_one({'_id': str(id_)})
-        except TypeError:
-            return
+        self._cache_pop((collection, db_name, str(id_)))
+        await self._run(self._delete, collection, db_name, str(id_))
+
+
+@functools.lru_cache(maxsize=4)
+def _normalize_token(token: str, fix_ssl: bool) -> str:
+
+    token = token.strip("<>")
+
+    if not fix_ssl:
+        return token
+
+    parse_result = urlparse(token)
+    parameters = parse_qs(parse_result.query)
+
+    parameters.update(
+        {
+            'ssl': ['true'],
+            'tlsAllowInvalidCertificates': ['true']
+        }
+    )
+
+    return urlunparse(parse_result._replace(query=urlencode(parameters, doseq=True)))
 
 
 class MongoDatabase(BaseDB):
@@ -208,51 +605,112 @@ class MongoDatabase(BaseDB):
 
         self.cache = LocalDatabase(dir_="./.db_cache")
 
-        fix_ssl = os.environ.get("MONGO_SSL_FIX") or os.environ.get("REPL_SLUG")
+        self._last_sent: OrderedDict[tuple, tuple[float, dict]] = OrderedDict()
 
-        if fix_ssl:
-            parse_result = urlparse(token)
-            parameters = parse_qs(parse_result.query)
+        fix_ssl = bool(os.environ.get("MONGO_SSL_FIX") or os.environ.get("REPL_SLUG"))
 
-            parameters.update(
-                {
-                    'ssl': ['true'],
-                    'tlsAllowInvalidCertificates': ['true']
-                }
-            )
+        self._connect = AsyncIOMotorClient(
+            _normalize_token(token, fix_ssl), connectTimeoutMS=timeout*1000, serverSelectionTimeoutMS=timeout*1000,
+            maxPoolSize=200, minPoolSize=20, maxIdleTimeMS=60000, retryWrites=True, compressors="zstd,zlib"
+        )
+
+    async def warmup(self):
+        try:
+            await self._connect.admin.command("ping")
+        except:
+            traceback.print_exc()
+
+    def _snapshot_get(self, key: tuple):
+
+        try:
+            ts, data = self._last_sent[key]
+        except KeyError:
+            return None
+
+        if time.monotonic() - ts >= self._cache_ttl:
+            del self._last_sent[key]
+            return None
 
-            token = urlunparse(parse_result._replace(query=urlencode(parameters, doseq=True)))
+        return data
 
-        self._connect = AsyncIOMotorClient(token.strip("<>"), connectTimeoutMS=timeout*1000)
+    def _snapshot_set(self, key: tuple, data: dict):
+        self._last_sent[key] = (time.monotonic(), data)
+        self._last_sent.move_to_end(key)
+        while len(self._last_sent) > self._cache_max_size:
+            self._last_sent.popitem(last=False)
 
     async def push_data(self, data, *, db_name: Union[DBModel.guilds, DBModel.users], collection: str):
+        if "_id" in data:
+            self._cache_pop((collection, db_name, str(data["_id"])))
+            self._last_sent.pop((collection, db_name, str(data["_id"])), None)
         await self._connect[collection][db_name].insert_one(data)
+        if "_id" in data:
+            self._cache_pop((collection, db_name, str(data["_id"])))
 
-    async def update_from_json(self):
+    async def update_from_json(self, batch_size: int = 500, max_concurrency: int = 4):
 
         if not os.path.isdir("./local_dbs/backups"):
             os.makedirs("./local_dbs/backups")
 
-        for f in os.listdir("./local_dbs"):
+        with os.scandir("./local_dbs") as it:
+            entries = [e for e in it if e.name.endswith(".json") and e.is_file()]
 
-            if not f.endswith(".json"):
-                continue
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        await asyncio.gather(*[self._import_json_file(e, semaphore, batch_size) for e in entries])
+
+    async def _import_json_file(self, entry: os.DirEntry, semaphore: asyncio.Semaphore, batch_size: int):
+
+        async with semaphore:
+
+            try:
+                async with aiofiles.open(entry.path, 'rb') as file:
+                    raw = await file.read()
+
+                data = orjson.loads(raw) if orjson else json.loads(raw)
+
+                collection = entry.name[:-5]
+
+                for db_name, db_data in data.items():
+
+                    if not db_data:
+                        continue
+
+                    coll = self._connect[collection].get_collection(db_name, write_concern=WriteConcern(w=1, j=False))
 
-            with open(f'./local_dbs/{f}') as file:
-                data = json.load(file)
+                    ops = []
+                    ids = []
 
-            for db_name, db_data in data.items():
+                    for id_, doc in db_data.items():
+                        id_ = str(id_)
+                        self._cache_pop((collection, db_name, id_))
+                        self._last_sent.pop((collection, db_name, id_), None)
+                        ids.append(id_)
+                        ops.append(UpdateOne({"_id": id_}, {"$set": doc}, upsert=True))
 
-                if not db_data:
-                    continue
+                        if len(ops) >= batch_size:
+                            await self.cache.delete_many(ids, db_name=db_name, collection=collection)
+                            await coll.bulk_write(ops, ordered=False)
+                            for written_id in ids:
+                                self._cache_pop((collection, db_name, written_id))
+                            ops = []
+                            ids = []
 
-                for id_, data in db_data.items():
-                    await self.update_data(id_=id_, data=data, db_name=db_name, collection=f[:-5])
+                    if ops:
+                        await self.cache.delete_many(ids, db_name=db_name, collection=collection)
+                        await coll.bulk_write(ops, ordered=False)
+                        for written_id in ids:
+                            self._cache_pop((collection, db_name, written_id))
 
-                try:
-                    shutil.move(f"./local_dbs/{f}", f"./local_dbs/backups/{f}")
-                except:
-                    traceback.print_exc()
+            except Exception:
+                print(f"Falha ao importar o arquivo: {entry.path}")
+                traceback.print_exc()
+                return
+
+            try:
+                shutil.move(entry.path, f"./local_dbs/backups/{entry.name}")
+            except:
+                traceback.print_exc()
 
     async def get_secret_data(self, id_:int, db_name: Union[DBModel.users_secret, DBModel.global_secrets]):
         return await self.get_data(
@@ -261,37 +719,75 @@ class MongoDatabase(BaseDB):
         )
 
     async def get_data(self, id_: int, *, db_name: Union[DBModel.guilds, DBModel.users],
-                       collection: str, default_model: dict = None):
+                       collection: str, default_model: dict = None, projection: dict = None):
 
         if not default_model:
             default_model = db_models
 
         id_ = str(id_)
 
+        cache_key = (collection, db_name, id_)
+
+        if (data := self._cache_get(cache_key)) is not None:
+            return _apply_projection(data, projection) if projection else data
+
+        if projection:
+
+            projection_key = cache_key + (_projection_key(projection),)
+
+            if (data := self._cache_get(projection_key)) is not None:
+                return data
+
+            async def fetch_projected():
+
+                generation = self._cache_generation()
+
+                if not (data := await self._connect[collection][db_name].find_one({"_id": id_}, projection=dict(projection))):
+                    data = _apply_projection(_fresh_template(default_model, db_name), projection)
+
+                self._cache_set(projection_key, data, generation)
+                return data
+
+            return await self._singleflight(projection_key, fetch_projected)
+
+        return await self._singleflight(
+            cache_key, lambda: self._fetch_data(id_, db_name=db_name, collection=collection, default_model=default_model)
+        )
+
+    async def _fetch_data(self, id_: str, *, db_name: str, collection: str, default_model: dict):
+
+        cache_key = (collection, db_name, id_)
+
+        generation = self._cache_generation()
+
         update_cache = False
 
         try:
-            data = self.cache._connect[collection][db_name].find_one({"_id": id_})
+            data = await self.cache.find_one(collection, db_name, id_)
         except:
             traceback.print_exc()
             data = {}
             update_cache = True
 
         if not data:
-            data = await self._connect[collection][db_name].find_one({"_id": id_})
+            if (data := await self._connect[collection][db_name].find_one({"_id": id_})) \
+                    and not self._cache_stale(cache_key, generation):
+                self._snapshot_set(cache_key, deepcopy(data))
 
         if not data:
-            data = default_model[db_name].copy()
+            data = _fresh_template(default_model, db_name)
             try:
                 await self.cache.update_data(id_, data, db_name=db_name, collection=collection, default_model=default_model)
             except:
                 traceback.print_exc()
+            self._cache_set(cache_key, data, generation)
             return data
 
         elif data["ver"] != default_model[db_name]["ver"]:
-            data = update_values(default_model[db_name].copy(), data)
+            data = update_values(_fresh_template(default_model, db_name), data)
             data["ver"] = default_model[db_name]["ver"]
             await self.update_data(id_, data, db_name=db_name, collection=collection)
+            generation = self._cache_generation()
 
         elif update_cache:
             try:
@@ -299,27 +795,136 @@ class MongoDatabase(BaseDB):
             except:
                 traceback.print_exc()
 
+        self._cache_set(cache_key, data, generation)
+
         return data
 
     async def update_data(self, id_, data: dict, *, db_name: Union[DBModel.guilds, DBModel.users, str],
                           collection: str, default_model: dict = None):
 
-        await self._connect[collection][db_name].update_one({'_id': str(id_)}, {'$set': data}, upsert=True)
+        key = (collection, db_name, str(id_))
+
+        self._cache_pop(key)
+
+        if (last_sent := self._snapshot_get(key)) is None:
+            diff = data
+        else:
+            diff = _diff_fields(last_sent, data)
+
+        if diff:
+            await self._connect[collection][db_name].update_one({'_id': str(id_)}, {'$set': diff}, upsert=True)
+            self._cache_pop(key)
+            self._snapshot_set(key, dict(last_sent or {}, **deepcopy(data)))
+
         await self.cache.update_data(id_, data, db_name=db_name, collection=collection, default_model=default_model)
         return data
 
-    async def query_data(self, db_name: str, collection: str, filter: dict = None, limit=100) -> list:
-        return [d async for d in self._connect[collection][db_name].find(filter or {})]
+    async def warm_prefixes(self, guild_ids: list[int]) -> dict[int, str]:
+
+        prefixes = {int(g): "" for g in guild_ids}
+
+        if not prefixes or len(prefixes) > self._cache_max_size // 2:
+            return {}
+
+        generation = self._cache_generation()
+
+        cursor = self._connect["global"][DBModel.guilds].find(
+            {"_id": {"$in": [str(g) for g in prefixes]}, "prefix": {"$nin": ["", None]}}, {"_id": 1, "prefix": 1}
+        )
+
+        for d in await cursor.to_list(length=None):
+            prefixes[int(d["_id"])] = d["prefix"]
+
+        projection_key = _projection_key(PREFIX_PROJECTION)
+
+        for guild_id, prefix in prefixes.items():
+            self._cache_set(("global", DBModel.guilds, str(guild_id), projection_key), {"prefix": prefix}, generation)
+
+        return prefixes
+
+    async def query_data(self, db_name: str, collection: str, filter: dict = None, limit=100,
+                         projection: dict = None) -> list:
+        cursor = self._connect[collection][db_name].find(filter or {}, projection=projection)
+        if limit:
+            cursor = cursor.limit(limit)
+        return await cursor.to_list(length=limit)
 
     async def delete_data(self, id_, db_name: str, collection: str):
+        self._cache_pop((collection, db_name, str(id_)))
+        self._last_sent.pop((collection, db_name, str(id_)), None)
         await self.cache.delete_data(id_, db_name=db_name, collection=collection)
-        return await self._connect[collection][db_name].delete_one({'_id': str(id_)})
+        result = await self._connect[collection][db_name].delete_one({'_id': str(id_)})
+        self._cache_pop((collection, db_name, str(id_)))
+        return result
+
+
+def _apply_projection(data: dict, projection: dict) -> dict:
+
+    if any(isinstance(v, dict) for v in projection.values()):
+        raise ValueError("Operadores de projection não são suportados.")
+
+    fields = {k: bool(v) for k, v in projection.items() if k != "_id"}
+    include_id = bool(projection.get("_id", 1))
+
+    if len(set(fields.values())) > 1:
+        raise ValueError("Projection não pode misturar inclusão e exclusão de campos.")
+
+    if (fields and all(fields.values())) or (not fields and include_id):
+
+        result = {}
+
+        for path in (*fields, *(("_id",) if include_id else ())):
+            parts = path.split(".")
+            src, dst = data, result
+            for i, part in enumerate(parts):
+                if type(src) is not dict or part not in src:
+                    break
+                if i == len(parts) - 1:
+                    dst[part] = src[part]
+                elif type(src[part]) is dict:
+                    src, dst = src[part], dst.setdefault(part, {})
+                else:
+                    break
+
+        return result
+
+    result = dict(data)
+
+    for path in (*fields, *(() if include_id else ("_id",))):
+        parts = path.split(".")
+        node = result
+        for part in parts[:-1]:
+            if type(child := node.get(part)) is not dict:
+                break
+            node[part] = node = dict(child)
+        else:
+            node.pop(parts[-1], None)
+
+    return result
+
+
+def _diff_fields(old: dict, new: dict, prefix: str = "") -> dict:
+    diff = {}
+    for k, v in new.items():
+        o = old.get(k, _MISSING)
+        if type(v) is dict and type(o) is dict and v and o.keys() <= v.keys() \
+                and all(type(sk) is str and "." not in sk and not sk.startswith("$") for sk in v):
+            diff.update(_diff_fields(o, v, f"{prefix}{k}."))
+        elif o != v or type(o) is not type(v):
+            diff[f"{prefix}{k}"] = v
+    return diff
 
 
 def update_values(d, u):
-    for k, v in u.items():
-        if isinstance(v, collections.abc.Mapping):
-            d[k] = update_values(d.get(k, {}), v)
-        elif not isinstance(v, list):
-            d[k] = v
-    return d
\ No newline at end of file
+    stack = [(d, u)]
+    while stack:
+        dd, uu = stack.pop()
+        for k, v in uu.items():
+            if type(v) is dict:
+                child = dd.get(k)
+                if type(child) is not dict:
+                    child = dd[k] = {}
+                stack.append((child, v))
+            elif type(v) is not list:
+                dd[k] = v
+    return d